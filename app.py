@@ -1,15 +1,137 @@
+import datetime
+import secrets
+import ssl
+
 import streamlit as st
 import pandas as pd
-import random
+import numpy as np
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+from lxml import html as lxhtml
+
+# 통계 페이지 이후 JSON으로 보충할 최대 회차 수 (요청 폭주 방지)
+MAX_NEW_DRAWS = 4
 
-# SSL 경고 숨기기 (깔끔한 로그를 위해)
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# 공 한 개의 HTML 틀 (색상은 배경색만 다르고 나머지는 .lotto-ball 클래스)
+BALL_TMPL = "<div class='lotto-ball' style='background:{c}'>{n}</div>"
 
 # ---------------------------------------------------------
 # 1. 데이터 수집 및 전처리
 # ---------------------------------------------------------
+class _TLSAdapter(HTTPAdapter):
+    """
+    미리 만든 SSLContext(구형 암호 스위트 허용)를 커넥션 풀에 넘겨주는 어댑터입니다.
+    핸드셰이크 비용은 세션의 keep-alive 커넥션 재사용으로 줄어듭니다.
+    (requests 2.32.0~2.32.2는 여기서 넘긴 ssl_context를 무시하므로 2.32.3 이상 필요)
+    """
+    def __init__(self, ssl_context, **kwargs):
+        # 부모 __init__에서 init_poolmanager를 호출하므로 먼저 저장
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+@st.cache_resource
+def get_session():
+    """
+    동행복권 서버와의 연결(TCP/TLS)을 재사용하기 위한 공용 세션입니다.
+    스크립트가 다시 실행되어도 프로세스 안에서 하나만 유지됩니다.
+    """
+    # 인증서 검증은 유지하고, 동행복권 서버의 구형 암호 스위트만 허용
+    ctx = ssl.create_default_context()
+    ctx.set_ciphers('DEFAULT@SECLEVEL=1')
+
+    session = requests.Session()
+    adapter = _TLSAdapter(
+        ctx,
+        pool_connections=10,
+        pool_maxsize=20,
+        # 연결 자체가 막힌 경우는 재시도하지 않고 곧바로 백업 데이터로 전환
+        max_retries=urllib3.Retry(total=2, connect=0, backoff_factor=0.3)
+    )
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://dhlottery.co.kr/'
+    })
+    return session
+
+def _parse_stat_table(root):
+    """
+    lxml XPath로 '당첨횟수' 통계 표만 골라 (번호, 횟수) 행을 뽑아냅니다.
+    서로 다른 45개 번호를 정확히 찾지 못하면 None을 반환합니다.
+    """
+    rows = []
+    # 통계 표를 감싼 레이아웃 표는 제외 (행이 중복으로 잡히는 것 방지)
+    for tr in root.xpath('//table[contains(., "당첨횟수") and not(.//table)]//tr'):
+        cells = [td.text_content().strip() for td in tr.xpath('./td')]
+        if len(cells) >= 3:
+            rows.append((cells[0], cells[2]))
+
+    if len(rows) != 45 or len({number for number, _ in rows}) != 45:
+        return None
+    return pd.DataFrame(rows, columns=['number', 'count'])
+
+def _has_all_numbers(df):
+    """1번부터 45번까지 모든 번호가 중복 없이 들어 있는지 확인합니다."""
+    return np.array_equal(np.sort(df['number'].to_numpy()), np.arange(1, 46))
+
+def _parse_last_draw(root):
+    """
+    통계 페이지가 몇 회차까지 집계했는지 조회 기간 선택 상자에서 읽어옵니다.
+    찾지 못하면 None을 반환합니다 (이 경우 새 회차 보충은 건너뜀).
+    """
+    values = root.xpath('//select[@id="edDrwNo"]/option[@selected]/@value')
+    if not values:
+        values = root.xpath('//select[@id="edDrwNo"]/option[1]/@value')
+    if values and values[0].strip().isdigit():
+        return int(values[0])
+    return None
+
+def _fetch_draw(session, drw_no):
+    """
+    회차별 당첨번호 JSON을 받아 본번호 6개를 튜플로 돌려줍니다.
+    아직 추첨되지 않은 회차면 None을 반환합니다.
+    """
+    url = f"https://www.dhlottery.co.kr/common.do?method=getLottoNumber&drwNo={drw_no}"
+    data = session.get(url, timeout=3).json()
+    if data.get('returnValue') != 'success':
+        return None
+    return tuple(data[f'drwtNo{k}'] for k in range(1, 7))
+
+@st.cache_resource
+def _draw_cache():
+    """
+    지난 회차 당첨번호는 바뀌지 않으므로 {회차: 번호 6개}를 프로세스 동안 보관합니다.
+    """
+    return {}
+
+def _add_new_draws(session, df, base_drw_no):
+    """
+    통계 페이지가 아직 반영하지 못한 최근 회차(최대 MAX_NEW_DRAWS개)만
+    JSON으로 받아 당첨 횟수에 더합니다. df는 번호 순으로 정렬되어 있어야 합니다.
+    """
+    # 1회차(2002-12-07) 이후 매주 토요일 추첨 → 날짜로 최신 회차 추정
+    first_draw = datetime.date(2002, 12, 7)
+    latest = (datetime.date.today() - first_draw).days // 7 + 1
+    last = min(latest, base_drw_no + MAX_NEW_DRAWS)
+
+    draws = _draw_cache()
+    counts = df['count'].to_numpy().copy()
+    for drw_no in range(base_drw_no + 1, last + 1):
+        if drw_no not in draws:
+            numbers = _fetch_draw(session, drw_no)
+            if numbers is None:
+                break # 아직 추첨 전인 회차
+            draws[drw_no] = numbers
+        for n in draws[drw_no]:
+            counts[n - 1] += 1
+
+    return df.assign(count=counts)
+
 @st.cache_data(ttl=3600)
 def get_lotto_data():
     """
@@ -17,35 +139,59 @@ def get_lotto_data():
     함수 안에서는 UI(st.toast 등)를 사용하지 않습니다.
     """
     url = "https://dhlottery.co.kr/gameResult.do?method=statByNumber"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': 'https://dhlottery.co.kr/'
-    }
     
     try:
-        # SSL 검증 무시 및 타임아웃 설정
-        response = requests.get(url, headers=headers, timeout=5, verify=False)
-        response.encoding = 'euc-kr'
+        # 타임아웃 설정 (연결 3초, 응답 5초)
+        session = get_session()
+        response = session.get(url, timeout=(3, 5))
         
-        # 테이블 읽기
-        dfs = pd.read_html(response.text, match='번호')
+        # 응답 바이트를 그대로 넘겨 lxml 내부(C)에서 euc-kr 디코딩
+        parser = lxhtml.HTMLParser(encoding='euc-kr')
+        root = lxhtml.fromstring(response.content, parser=parser)
         
-        if len(dfs) > 0:
-            df = dfs[0]
-            # 데이터 정제
-            df_clean = df.iloc[:, [0, 2]].copy()
-            df_clean.columns = ['number', 'count']
-            df_clean['number'] = pd.to_numeric(df_clean['number'], errors='coerce')
-            df_clean['count'] = pd.to_numeric(df_clean['count'], errors='coerce')
+        # 테이블 읽기 (lxml로 직접 파싱, 실패 시 read_html로 대체)
+        df_clean = _parse_stat_table(root)
+        if df_clean is not None:
+            # 데이터 정제: 숫자가 아닌 칸이 하나라도 있으면 read_html로 대체
+            is_digit = (
+                df_clean['number'].str.match(r'^\d+$', na=False)
+                & df_clean['count'].str.match(r'^\d+$', na=False)
+            )
+            if is_digit.all():
+                df_clean = df_clean.astype({'number': np.int32, 'count': np.int32})
+            else:
+                df_clean = None
+        
+        if df_clean is None:
+            response.encoding = 'euc-kr'
+            dfs = pd.read_html(response.text, match='번호', flavor='lxml')
+            if len(dfs) > 0:
+                # 데이터 정제: read_html은 열을 float로 추론할 수 있어 숫자로 변환
+                df_clean = dfs[0].iloc[:, [0, 2]].apply(pd.to_numeric, errors='coerce')
+                df_clean.columns = ['number', 'count']
+                df_clean = df_clean.dropna().astype(np.int32)
+        
+        # 1~45번이 정확히 한 번씩 있을 때만 성공으로 간주
+        if df_clean is not None and _has_all_numbers(df_clean):
+            df_clean = df_clean.sort_values('number')
+            
+            # 통계 페이지 이후 추첨된 회차만 JSON으로 보충 (실패해도 통계 값은 그대로 사용)
+            base_drw_no = _parse_last_draw(root)
+            if base_drw_no is not None:
+                try:
+                    df_clean = _add_new_draws(session, df_clean, base_drw_no)
+                except Exception:
+                    pass
             
             # 성공 시: 데이터프레임과 False(백업아님) 반환
-            return df_clean.dropna().astype(int).sort_values('number'), False
+            return df_clean, False
             
     except Exception:
         pass # 실패하면 조용히 아래 백업 로직으로 이동
 
     # -----------------------------------------------------
     # [비상용] 크롤링 실패 시 사용할 백업 데이터
+    # (모듈 최상단은 재실행마다 다시 실행되므로 여기서만 생성)
     # -----------------------------------------------------
     backup_counts = [
         186, 172, 174, 179, 163, 168, 172, 164, 145, 172, # 1~10
@@ -56,8 +202,8 @@ def get_lotto_data():
     ]
     
     df_backup = pd.DataFrame({
-        'number': range(1, 46),
-        'count': backup_counts
+        'number': np.arange(1, 46, dtype=np.int32),
+        'count': np.array(backup_counts, dtype=np.int32)
     })
     
     # 실패 시: 백업 데이터프레임과 True(백업임) 반환
@@ -66,34 +212,80 @@ def get_lotto_data():
 # ---------------------------------------------------------
 # 2. 가중치 계산 및 번호 추첨 로직
 # ---------------------------------------------------------
-def generate_lotto_numbers(df):
-    results = []
-    
+@st.cache_resource
+def get_rng():
+    """
+    secrets로 시드를 만든 PCG64 난수 생성기를 프로세스 전체에서 재사용합니다.
+    (재실행 때마다 새로 만들지 않도록 cache_resource에 보관)
+    """
+    return np.random.Generator(np.random.PCG64(secrets.randbits(128)))
+
+@st.cache_resource(max_entries=4)
+def _prepare_arrays(fingerprint, _df):
+    """
+    번호 배열과 추첨 확률 배열을 NumPy로 변환해 캐시합니다.
+    캐시 키는 가벼운 fingerprint만 사용하고, _df는 해싱하지 않습니다.
+    """
     # 가중치 평준화 (Smoothing): 격차를 1.5배 수준으로 완화
-    smoothing_factor = 100 
-    
-    weights = [count + smoothing_factor for count in df['count'].tolist()]
-    numbers = df['number'].tolist()
-    
-    for _ in range(5):
-        current_numbers = list(numbers)
-        current_weights = list(weights)
-        one_set = []
-        
-        for _ in range(7):
-            picked_list = random.choices(current_numbers, weights=current_weights, k=1)
-            picked = picked_list[0]
-            one_set.append(picked)
-            
-            idx = current_numbers.index(picked)
-            del current_numbers[idx]
-            del current_weights[idx]
-        
-        main_nums = sorted(one_set[:6])
-        bonus_num = one_set[6]
-        results.append((main_nums, bonus_num))
-        
-    return results
+    smoothing_factor = 100.0
+
+    numbers = _df['number'].to_numpy(np.int64)
+    weights = _df['count'].to_numpy(np.float64) + smoothing_factor
+    p = weights / weights.sum()
+
+    # 프로세스 전체에서 공유되는 객체이므로 읽기 전용으로 고정
+    numbers.setflags(write=False)
+    p.setflags(write=False)
+    return numbers, p
+
+def _fingerprint(df):
+    # 새 회차가 반영되면 총 당첨 횟수가 항상 늘어나므로 (행 수, 합계)로 충분
+    return len(df), int(df['count'].sum())
+
+def generate_lotto_numbers(df, n_sets=5):
+    numbers, p = _prepare_arrays(_fingerprint(df), df)
+
+    # 가중치 기반 비복원 추출을 모든 세트에 한 번에 적용 (지수분포 키 기법)
+    # 키 = Exp(1) / 가중치 → 키가 작은 순서가 곧 뽑힌 순서
+    keys = get_rng().exponential(size=(n_sets, p.size)) / p
+    idx = np.argpartition(keys, 6, axis=1)[:, :7]
+    order = np.argsort(np.take_along_axis(keys, idx, axis=1), axis=1)
+    picks = numbers[np.take_along_axis(idx, order, axis=1)]
+
+    # 7개 중 앞의 6개는 본번호, 마지막 1개는 보너스
+    main = np.sort(picks[:, :6], axis=1)
+    bonus = picks[:, 6]
+    return list(zip(main.tolist(), bonus.tolist()))
+
+@st.cache_resource
+def get_ball_html():
+    """
+    공 HTML은 번호만으로 결정되므로 45개를 한 번만 만들어 둡니다 (인덱스 = 번호 - 1).
+    모듈 최상단은 재실행마다 다시 실행되므로 cache_resource에 보관합니다.
+    """
+    # 번호별 공 색상
+    colors = (
+        ['#fbc400'] * 10 +  # 1~10 노랑
+        ['#69c8f2'] * 10 +  # 11~20 파랑
+        ['#ff7272'] * 10 +  # 21~30 빨강
+        ['#aaaaaa'] * 10 +  # 31~40 회색
+        ['#b0d840'] * 5     # 41~45 초록
+    )
+    return tuple(BALL_TMPL.format(c=c, n=n) for n, c in enumerate(colors, start=1))
+
+def balls_html(main, bonus):
+    """본번호 6개와 보너스 번호 1개를 공 모양 HTML 한 줄로 만듭니다."""
+    ball_html = get_ball_html()
+    balls = "".join(ball_html[n - 1] for n in main)
+    # 보너스 볼
+    bonus_ball = ball_html[bonus - 1]
+    return (
+        "<div class='lotto-row'>"
+        + balls
+        + "<div class='lotto-plus'>+</div>"
+        + bonus_ball
+        + "</div>"
+    )
 
 # ---------------------------------------------------------
 # 3. 앱 화면 구성
@@ -111,6 +303,22 @@ st.markdown("""
     .stButton>button:hover {
         background-color: #FF2222;
     }
+    .lotto-row {
+        display: flex; align-items: center; gap: 8px; flex-wrap: wrap;
+        margin-bottom: 15px;
+    }
+    .lotto-ball {
+        color: #fff; width: 38px; height: 38px; border-radius: 50%;
+        display: flex; justify-content: center; align-items: center;
+        font-weight: bold;
+        box-shadow: 2px 2px 5px rgba(0,0,0,0.2);
+    }
+    .lotto-plus {
+        font-weight: bold; color: #ccc;
+    }
+    .lotto-divider {
+        border-bottom: 1px solid #eee; margin-bottom: 15px;
+    }
     </style>
 """, unsafe_allow_html=True)
 
@@ -128,7 +336,7 @@ if is_backup:
 
 if not df_stats.empty:
     with st.expander("📊 현재 적용된 가중치 정보 보기"):
-        top = df_stats.sort_values('count', ascending=False).iloc[0]
+        top = df_stats.loc[df_stats['count'].idxmax()]
         st.write(f"**최다 당첨 번호:** {top['number']}번")
         st.write(f"**누적 당첨 횟수:** {top['count']}회")
         st.info("당첨 횟수가 많은 번호가 조금 더 높은 확률로 추첨됩니다.")
@@ -140,30 +348,15 @@ if not df_stats.empty:
         st.balloons()
         st.success("추첨 완료! 이번 주 주인공은 바로 당신입니다. 🍀")
         
+        # 5게임 전체를 한 번의 st.markdown으로 출력
+        parts = []
         for i, (main, bonus) in enumerate(games, 1):
-            st.markdown(f"##### GAME {i}")
-            
-            # 디자인 요소
-            def get_color(n):
-                if n <= 10: return "#fbc400" # 노랑
-                elif n <= 20: return "#69c8f2" # 파랑
-                elif n <= 30: return "#ff7272" # 빨강
-                elif n <= 40: return "#aaaaaa" # 회색
-                else: return "#b0d840" # 초록
-            
-            html = "<div style='display:flex; align-items:center; gap:8px; flex-wrap:wrap; margin-bottom:15px;'>"
-            for num in main:
-                c = get_color(num)
-                html += f"<div style='background:{c}; color:#fff; width:38px; height:38px; border-radius:50%; display:flex; justify-content:center; align-items:center; font-weight:bold; box-shadow: 2px 2px 5px rgba(0,0,0,0.2);'>{num}</div>"
-            
-            html += "<div style='font-weight:bold; color:#ccc;'>+</div>"
-            
-            # 보너스 볼
-            html += f"<div style='background:{get_color(bonus)}; color:#fff; width:38px; height:38px; border-radius:50%; display:flex; justify-content:center; align-items:center; font-weight:bold; box-shadow: 2px 2px 5px rgba(0,0,0,0.2);'>{bonus}</div>"
-            html += "</div>"
-            
-            st.markdown(html, unsafe_allow_html=True)
-            st.markdown("<div style='border-bottom:1px solid #eee; margin-bottom:15px;'></div>", unsafe_allow_html=True)
+            parts.append(
+                f"<h5>GAME {i}</h5>"
+                + balls_html(main, bonus)
+                + "<div class='lotto-divider'></div>"
+            )
+        st.markdown("".join(parts), unsafe_allow_html=True)
 
 else:
     st.error("시스템 오류가 발생했습니다.")